@@ -2,12 +2,15 @@
 """
 from base64 import b64encode
 import datetime
+from email.utils import formatdate
+import functools
 from hashlib import sha256
 import logging
 import re
 
 from flask import request
 from google.cloud import ndb
+import orjson
 from granary import as2
 from oauth_dropins.webutil import flask_util, util
 from oauth_dropins.webutil.flask_util import error
@@ -16,12 +19,18 @@ from oauth_dropins.webutil.util import json_dumps, json_loads
 from app import app, cache
 import common
 from common import redirect_unwrap, redirect_wrap
-from models import Activity, Follower, User
+from models import Activity, Follower, FolloweeIndex, User
 from httpsig.requests_auth import HTTPSignatureAuth
 
 logger = logging.getLogger(__name__)
 
-CACHE_TIME = datetime.timedelta(seconds=15)
+CACHE_TIME = datetime.timedelta(minutes=10)
+
+# matches a '"type": "Delete"' JSON member in a raw request body. quotes are
+# escaped inside JSON string values, so this can't fire on post content; at
+# worst it matches an activity with an embedded Delete object, which we don't
+# handle either.
+DELETE_TYPE_RE = re.compile(r'"type"\s*:\s*"Delete"')
 
 SUPPORTED_TYPES = (
     'Accept',
@@ -39,47 +48,158 @@ SUPPORTED_TYPES = (
 )
 
 
-def send(activity, inbox_url, user_domain):
+@cache.memoize(timeout=CACHE_TIME.total_seconds())
+def follower_domains(actor_id):
+    """Returns domains of the Bridgy Fed users following the given AP actor.
+
+    One key lookup on :class:`FolloweeIndex` instead of a query that scans an
+    index row per follower. Memoized for CACHE_TIME since a busy actor can fan
+    out many posts in a short window; the follow and unfollow paths evict
+    eagerly with cache.delete_memoized, so the TTL only bounds staleness from
+    out-of-band datastore edits.
+
+    Args:
+      actor_id: string, AP actor id
+
+    Returns:
+      list of string domains
+    """
+    index = FolloweeIndex.get_by_id(actor_id)
+    if index is not None:
+        return index.srcs
+
+    # no index entity yet; fall back to scanning Follower. (followees from
+    # before FolloweeIndex only get indexed on their next follow.)
+    return [f.src for f in Follower.query(Follower.dest == actor_id,
+                                          projection=[Follower.src]).fetch()]
+
+
+@functools.lru_cache(maxsize=4096)
+def inbox_host(inbox_url):
+    """Returns the Host header value for the given inbox URL.
+
+    Cached since inbox URLs repeat heavily across deliveries and
+    domain_from_link re-parses the URL every time.
+
+    Args:
+      inbox_url: string
+
+    Returns:
+      string
+    """
+    return util.domain_from_link(inbox_url, minimize=False)
+
+
+# small cache: fanning a post out to followers signs and sends the same body
+# once per inbox, so reuse its digest across the batch instead of re-hashing
+@functools.lru_cache(maxsize=128)
+def digest_header(body):
+    """Returns the HTTP Digest header value for the given request body.
+
+    Args:
+      body: bytes
+
+    Returns:
+      string
+    """
+    # hashlib is OpenSSL-backed, which dispatches to hardware SHA-256 (SHA-NI
+    # on x86, the ARMv8 crypto extensions) at runtime when the CPU supports
+    # it, so this is already the fastest implementation available.
+    return 'SHA-256=' + b64encode(sha256(body).digest()).decode()
+
+
+@functools.lru_cache(maxsize=1024)
+def get_user(domain):
+    """Read-through cache in front of :meth:`models.User.get_or_create`.
+
+    Users' key material never changes after creation, so the send path can
+    skip the datastore get (and occasional put) per outbound delivery. Don't
+    use this anywhere the entity's mutable properties (actor_as2,
+    has_redirects, ...) matter; those are updated by :meth:`models.User.verify`
+    and would go stale here.
+
+    Args:
+      domain: string
+
+    Returns:
+      :class:`models.User`
+    """
+    return User.get_or_create(domain)
+
+
+@functools.lru_cache(maxsize=1024)
+def signature_auth(key_id, user_domain):
+    """Returns an HTTP Signature auth object for signing as the given user.
+
+    Constructing an :class:`HTTPSignatureAuth` parses the PEM and builds an RSA
+    signer, which costs almost as much as the sign operation itself, so cache
+    it per user and reuse it across deliveries. Users' keys are generated once
+    in :meth:`models.User.get_or_create` and never rotated; if that ever
+    changes, entries here will need to be evicted on rotation.
+
+    Args:
+      key_id: string, HTTP Signature keyId, ie this user's actor URL
+      user_domain: string, domain of the bridgy fed user sending the request
+
+    Returns:
+      :class:`HTTPSignatureAuth`
+    """
+    user = get_user(user_domain)
+    return HTTPSignatureAuth(secret=user.private_pem(), key_id=key_id,
+                             algorithm='rsa-sha256', sign_header='signature',
+                             headers=('Date', 'Digest', 'Host'))
+
+
+def send(activity, inbox_url, user_domain, host_url=None):
     """Sends an ActivityPub request to an inbox.
 
     Args:
       activity: dict, AS2 activity
       inbox_url: string
       user_domain: string, domain of the bridgy fed user sending the request
+      host_url: string, optional base URL for the HTTP Signature keyId, ie the
+        host the user's actor lives on. Defaults to request.host_url; task
+        queue deliveries must pass the host the activity was enqueued on,
+        since Cloud Tasks dispatches to the appspot domain and receivers
+        check that the keyId owner matches the activity's actor.
 
     Returns:
       requests.Response
     """
-    logger.info(f'Sending AP request from {user_domain}: {json_dumps(activity, indent=2)}')
+    logger.info('Sending AP request from %s: %s', user_domain, activity)
 
     # prepare HTTP Signature (required by Mastodon)
     # https://w3c.github.io/activitypub/#authorization
     # https://tools.ietf.org/html/draft-cavage-http-signatures-07
     # https://github.com/tootsuite/mastodon/issues/4906#issuecomment-328844846
-    key_id = request.host_url + user_domain
-    user = User.get_or_create(user_domain)
-    auth = HTTPSignatureAuth(secret=user.private_pem(), key_id=key_id,
-                             algorithm='rsa-sha256', sign_header='signature',
-                             headers=('Date', 'Digest', 'Host'))
+    auth = signature_auth((host_url or request.host_url) + user_domain,
+                          user_domain)
 
     # deliver to inbox
-    body = json_dumps(activity).encode()
+    body = orjson.dumps(activity)
     headers = {
         'Content-Type': common.CONTENT_TYPE_AS2,
         # required for HTTP Signature
         # https://tools.ietf.org/html/draft-cavage-http-signatures-07#section-2.1.3
-        'Date': datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        # formatdate emits the same RFC 1123 format as the old strftime call,
+        # without strftime's locale machinery
+        'Date': formatdate(usegmt=True),
         # required by Mastodon
         # https://github.com/tootsuite/mastodon/pull/14556#issuecomment-674077648
-        'Digest': 'SHA-256=' + b64encode(sha256(body).digest()).decode(),
-        'Host': util.domain_from_link(inbox_url, minimize=False),
+        'Digest': digest_header(body),
+        'Host': inbox_host(inbox_url),
     }
     return common.requests_post(inbox_url, data=body, auth=auth,
                                 headers=headers)
 
 
+def actor_cache_key(domain=None):
+    """Cache key for a domain's AS2 actor; also used to invalidate on update."""
+    return f'actor {domain}'
+
+
 @app.get(f'/<regex("{common.DOMAIN_RE}"):domain>')
-@flask_util.cached(cache, CACHE_TIME)
+@cache.cached(CACHE_TIME.total_seconds(), make_cache_key=actor_cache_key)
 def actor(domain):
     """Fetches a domain's h-card and converts to AS2 actor."""
     actor = common.actor(domain)
@@ -94,7 +214,14 @@ def actor(domain):
 def inbox(domain=None):
     """Handles ActivityPub inbox delivery."""
     body = request.get_data(as_text=True)
-    logger.info(f'Got: {body}')
+    logger.info('Got: %s', body)
+
+    # we ignore Deletes (see below), and they arrive in floods - eg
+    # mastodon.social sends one per account, all at once - so drop them with a
+    # cheap regex peek instead of paying for a full JSON parse each.
+    if DELETE_TYPE_RE.search(body):
+        logger.info('Ignoring Delete')
+        return ''
 
     # parse and validate AS2 activity
     try:
@@ -103,8 +230,6 @@ def inbox(domain=None):
     except (TypeError, ValueError, AssertionError):
         error("Couldn't parse body as JSON", exc_info=True)
 
-    logger.info(f'Got: {json_dumps(activity, indent=2)}')
-
     obj = activity.get('object') or {}
     if isinstance(obj, str):
         obj = {'id': obj}
@@ -152,7 +277,7 @@ def inbox(domain=None):
 
     # send webmentions to each target
     as1 = as2.to_as1(activity)
-    source_as2 = json_dumps(activity_unwrapped)
+    source_as2 = orjson.dumps(activity_unwrapped).decode()
     sent = common.send_webmentions(as1, proxy=True, protocol='activitypub',
                                    source_as2=source_as2)
 
@@ -171,9 +296,7 @@ def inbox(domain=None):
             actor_id = actor.get('id')
             if actor_id:
                 logging.info(f'Finding followers of {actor_id}')
-                domains = [f.src for f in
-                           Follower.query(Follower.dest == actor_id,
-                                          projection=[Follower.src]).fetch()]
+                domains = follower_domains(actor_id)
         key = Activity(source=source, target='Public', direction='in',
                        protocol='activitypub', domain=domains, status='complete',
                        source_as2=source_as2).put()
@@ -206,6 +329,7 @@ def accept_follow(follow, follow_unwrapped):
     user_domain = util.domain_from_link(followee_unwrapped, minimize=False)
     Follower.get_or_create(dest=user_domain, src=follower_id,
                            last_follow=json_dumps(follow))
+    cache.delete_memoized(follower_domains, user_domain)
 
     # send AP Accept
     accept = {
@@ -251,6 +375,8 @@ def undo_follow(undo_unwrapped):
         logger.info(f'Marking {follower_obj.key} as inactive')
         follower_obj.status = 'inactive'
         follower_obj.put()
+        FolloweeIndex.remove(user_domain, follower)
+        cache.delete_memoized(follower_domains, user_domain)
     else:
         logger.warning(f'No Follower found for {user_domain} {follower}')
 
@@ -1,4 +1,6 @@
 """Main Flask application."""
+import os
+
 from flask import Flask
 from flask_caching import Cache
 import flask_gae_static
@@ -14,12 +16,19 @@ import common
 
 app = Flask(__name__, static_folder=None)
 app.template_folder = './templates'
+# when CACHE_REDIS_URL points at a shared Redis (ie Memorystore), all
+# instances share one cache instead of each warming its own in-process cache.
+# local dev and tests fall back to SimpleCache.
+redis_url = os.environ.get('CACHE_REDIS_URL')
 app.config.from_mapping(
     ENV='development' if appengine_info.DEBUG else 'PRODUCTION',
-    CACHE_TYPE='SimpleCache',
+    CACHE_TYPE='RedisCache' if redis_url else 'SimpleCache',
+    CACHE_REDIS_URL=redis_url,
     SECRET_KEY=util.read('flask_secret_key'),
 )
-app.json.compact = False
+# compact JSON responses; actor and webfinger docs are consumed by servers,
+# not people, and pretty-printing inflates them noticeably on the wire
+app.json.compact = True
 app.url_map.converters['regex'] = flask_util.RegexConverter
 app.after_request(flask_util.default_modern_headers)
 app.register_error_handler(Exception, flask_util.handle_exception)
@@ -37,4 +46,4 @@ cache = Cache(app)
 util.set_user_agent('Bridgy Fed (https://fed.brid.gy/)')
 
 
-import activitypub, add_webmention, pages, redirect, render, salmon, superfeedr, webfinger, webmention
+import activitypub, add_webmention, pages, redirect, render, salmon, superfeedr, tasks, webfinger, webmention
@@ -5,7 +5,7 @@ import urllib.parse
 import requests
 from werkzeug.exceptions import BadRequest, NotFound
 
-from Crypto.PublicKey import RSA
+from Crypto.PublicKey import ECC, RSA
 from django_salmon import magicsigs
 from flask import request
 from google.cloud import ndb
@@ -33,6 +33,11 @@ class User(StringIdModel):
     mod = ndb.StringProperty(required=True)
     public_exponent = ndb.StringProperty(required=True)
     private_exponent = ndb.StringProperty(required=True)
+    # Ed25519 private key, PEM. Generated alongside the RSA key so outbound
+    # HTTP Signatures can move off rsa-sha256 (Ed25519 signing is roughly 10x
+    # faster) once httpsig and enough fediverse peers support it. Not used for
+    # signing yet.
+    ed25519_key = ndb.TextProperty()
     has_redirects = ndb.BooleanProperty()
     has_hcard = ndb.BooleanProperty()
     actor_as2 = ndb.TextProperty()
@@ -52,7 +57,13 @@ class User(StringIdModel):
             # while depending on the amount of randomness available.
             pubexp, mod, privexp = magicsigs.generate()
             user = User(id=domain, mod=mod, public_exponent=pubexp,
-                        private_exponent=privexp)
+                        private_exponent=privexp,
+                        ed25519_key=ECC.generate(curve='Ed25519')
+                                       .export_key(format='PEM'))
+            user.put()
+        elif not user.ed25519_key:
+            # backfill users created before we generated Ed25519 keys
+            user.ed25519_key = ECC.generate(curve='Ed25519').export_key(format='PEM')
             user.put()
 
         return user
@@ -74,6 +85,14 @@ class User(StringIdModel):
                              magicsigs.base64_to_long(str(self.private_exponent))))
         return rsa.exportKey(format='PEM')
 
+    def ed25519_pem(self):
+        """Returns: str, PEM-encoded Ed25519 private key"""
+        return self.ed25519_key
+
+    def ed25519_public_pem(self):
+        """Returns: str, PEM-encoded Ed25519 public key"""
+        return ECC.import_key(self.ed25519_key).public_key().export_key(format='PEM')
+
     def address(self):
         """Returns this user's ActivityPub address, eg '@me@foo.com'."""
         domain = self.key.id()
@@ -182,6 +201,71 @@ class Activity(StringIdModel):
         return val.replace('__', '#')
 
 
+class FolloweeIndex(StringIdModel):
+    """Denormalized list of a followee's followers, for fast fan-out.
+
+    Key name is the followee, ie a :class:`Follower` dest value: either a
+    domain or an AP actor id. srcs and inboxes are parallel lists mirroring
+    the src values and inbox URLs of the followee's active Follower entities,
+    so that fan-out paths can load all follower domains and inboxes with a
+    single get instead of hydrating one entity (and parsing one last_follow
+    blob) per follower. An empty string in inboxes means no known inbox. Kept
+    in sync by :meth:`Follower.get_or_create` and
+    :func:`activitypub.undo_follow`; created on a followee's first follow
+    after deploy, seeded from their pre-existing Follower entities.
+    """
+    srcs = ndb.StringProperty(repeated=True)
+    inboxes = ndb.StringProperty(repeated=True)
+
+    def _pad_inboxes(self):
+        """Realigns inboxes with srcs for entities from before inboxes existed."""
+        self.inboxes += [''] * (len(self.srcs) - len(self.inboxes))
+
+    @classmethod
+    def add(cls, dest, src, inbox=None):
+        seed = ()
+        if cls.get_by_id(dest) is None:
+            # first index write for this followee. seed it from Follower
+            # entities that predate the index, so they don't silently drop out
+            # of fan-out once the index exists and readers stop falling back
+            # to the Follower scan. runs outside the transaction since it's
+            # not an ancestor query; _add re-checks existence inside.
+            seed = tuple((f.src, f.inbox() or '')
+                         for f in Follower.query(Follower.dest == dest)
+                         if f.status != 'inactive' and f.src != src)
+        cls._add(dest, src, inbox, seed)
+
+    @classmethod
+    @ndb.transactional(join=True)
+    def _add(cls, dest, src, inbox, seed):
+        index = cls.get_by_id(dest)
+        if index is None:
+            index = cls(id=dest)
+            for seed_src, seed_inbox in seed:
+                index.srcs.append(seed_src)
+                index.inboxes.append(seed_inbox)
+        index._pad_inboxes()
+        if src in index.srcs:
+            if not inbox:
+                return
+            index.inboxes[index.srcs.index(src)] = inbox
+        else:
+            index.srcs.append(src)
+            index.inboxes.append(inbox or '')
+        index.put()
+
+    @classmethod
+    @ndb.transactional(join=True)
+    def remove(cls, dest, src):
+        index = cls.get_by_id(dest)
+        if index and src in index.srcs:
+            index._pad_inboxes()
+            i = index.srcs.index(src)
+            index.srcs.pop(i)
+            index.inboxes.pop(i)
+            index.put()
+
+
 class Follower(StringIdModel):
     """A follower of a Bridgy Fed user.
 
@@ -217,4 +301,19 @@ class Follower(StringIdModel):
         for prop, val in kwargs.items():
             setattr(follower, prop, val)
         follower.put()
+
+        if follower.status == 'inactive':
+            FolloweeIndex.remove(dest, src)
+        else:
+            FolloweeIndex.add(dest, src, inbox=follower.inbox())
+
         return follower
+
+    def inbox(self):
+        """Returns this follower's inbox URL from last_follow, or None."""
+        if self.last_follow:
+            actor = json_loads(self.last_follow).get('actor')
+            if actor and isinstance(actor, dict):
+                return ((actor.get('endpoints') or {}).get('sharedInbox') or
+                        actor.get('publicInbox') or
+                        actor.get('inbox'))
@@ -1,6 +1,8 @@
 """UI pages."""
 import calendar
+import copy
 import datetime
+import functools
 from itertools import islice
 import logging
 import re
@@ -9,10 +11,12 @@ import urllib.parse
 from flask import redirect, render_template, request
 from google.cloud.ndb.stats import KindStat
 from granary import as2, atom, microformats2, rss
+import orjson
 from oauth_dropins.webutil import flask_util, logs, util
 from oauth_dropins.webutil.flask_util import error, flash, redirect
 from oauth_dropins.webutil.util import json_dumps, json_loads
 
+import activitypub
 from app import app, cache
 import common
 from models import Follower, User, Activity
@@ -60,6 +64,8 @@ def check_web_site():
         raise
 
     user.put()
+    # their site, and so their actor, may have changed
+    cache.delete(activitypub.actor_cache_key(domain))
     return redirect(f'/user/{domain}')
 
 
@@ -146,21 +152,43 @@ def following(domain):
     )
 
 
+@functools.lru_cache(maxsize=512)
+def _source_to_as1(source_as2):
+    return as2.to_as1(orjson.loads(source_as2))
+
+
+def source_to_as1(source_as2):
+    """Converts a stored AS2 JSON string to an AS1 activity.
+
+    Cached on the JSON string, since feed pages re-convert the same stored
+    activities on every request. Returns a fresh copy because granary's
+    converters can modify the activities they're given.
+
+    Args:
+      source_as2: string, JSON AS2 activity
+
+    Returns:
+      dict, AS1 activity
+    """
+    return copy.deepcopy(_source_to_as1(source_as2))
+
+
 @app.get(f'/user/<regex("{common.DOMAIN_RE}"):domain>/feed')
 def feed(domain):
     format = request.args.get('format', 'html')
     if format not in ('html', 'atom', 'rss'):
         error(f'format {format} not supported; expected html, atom, or rss')
 
-    as2_activities, _, _ = Activity.query(
-        Activity.domain == domain, Activity.direction == 'in'
-        ).order(-Activity.created
-        ).fetch_page(PAGE_SIZE)
-    as1_activities = [as2.to_as1(json_loads(a.source_as2))
-                      for a in as2_activities
-                      if a.source_as2]
-    as1_activities = [a for a in as1_activities
-                      if a.get('verb') not in ('like', 'update', 'follow')]
+    # plain fetch, not fetch_page: we never use the cursor it builds. (a
+    # projection query would be nicer still, but source_as2 is an unindexed
+    # TextProperty, so it can't be projected.)
+    as1_activities = [
+        as1 for a in Activity.query(
+            Activity.domain == domain, Activity.direction == 'in',
+            ).order(-Activity.created).fetch(PAGE_SIZE)
+        if a.source_as2
+        and (as1 := source_to_as1(a.source_as2)).get('verb')
+            not in ('like', 'update', 'follow')]
 
     actor = {
       'displayName': domain,
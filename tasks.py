@@ -0,0 +1,59 @@
+"""Task queue handlers for deferred outbound deliveries.
+
+https://cloud.google.com/tasks/docs/creating-appengine-tasks
+"""
+import logging
+
+from flask import request
+from oauth_dropins.webutil import appengine_info, flask_util
+from oauth_dropins.webutil.flask_util import error
+from oauth_dropins.webutil.util import json_loads
+
+import activitypub
+from app import app
+from models import Activity
+
+logger = logging.getLogger(__name__)
+
+
+@app.post('/_ah/queue/deliver')
+def deliver():
+    """Delivers one outbound ActivityPub activity to one inbox.
+
+    Parameters:
+      activity_id: string, id of the :class:`Activity` to record status on
+      inbox: string, target inbox URL
+      user_domain: string, domain of the user the delivery is signed as
+      host_url: string, base URL of the host the delivery was enqueued on,
+        used for the HTTP Signature keyId. Cloud Tasks dispatches to the
+        appspot domain, so request.host_url here isn't necessarily the host
+        the activity's actor lives on.
+      activity: string, JSON AS2 activity to deliver
+    """
+    # App Engine strips X-AppEngine-* headers from external requests, so this
+    # confirms the request came from Cloud Tasks and not an outside caller.
+    if not request.headers.get('X-AppEngine-QueueName') and not appengine_info.LOCAL:
+        error('Not from Cloud Tasks', status=403)
+
+    activity_id = flask_util.get_required_param('activity_id')
+    inbox = flask_util.get_required_param('inbox')
+    user_domain = flask_util.get_required_param('user_domain')
+    host_url = flask_util.get_required_param('host_url')
+    source_activity = json_loads(flask_util.get_required_param('activity'))
+
+    activity = Activity.get_by_id(activity_id)
+    if not activity:
+        logger.warning(f'No Activity found for {activity_id}; giving up')
+        return ''
+
+    try:
+        activitypub.send(source_activity, inbox, user_domain,
+                         host_url=host_url)
+        activity.status = 'complete'
+    except BaseException:
+        activity.status = 'error'
+        activity.put()
+        raise  # Cloud Tasks retries on non-2xx
+
+    activity.put()
+    return ''
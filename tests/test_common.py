@@ -63,6 +63,16 @@ class CommonTest(testutil.TestCase):
         with self.assertRaises(BadGateway):
             resp = common.get_as2('http://orig')
 
+    @mock.patch('requests.get')
+    @mock.patch.object(common._session, 'get', return_value=AS2)
+    @mock.patch.object(common.appengine_info, 'LOCAL', False)
+    def test_requests_get_uses_pooled_session_in_prod(
+            self, mock_session_get, mock_get):
+        resp = common.requests_get('http://orig')
+        self.assertEqual(AS2, resp)
+        mock_session_get.assert_called_once()
+        mock_get.assert_not_called()
+
     def test_redirect_wrap_empty(self):
         self.assertIsNone(common.redirect_wrap(None))
         self.assertEqual('', common.redirect_wrap(''))
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""Unit tests for tasks.py."""
+from unittest import mock
+
+from oauth_dropins.webutil import appengine_info
+from oauth_dropins.webutil.util import json_dumps
+from werkzeug.exceptions import BadGateway
+
+import activitypub
+from models import Activity
+from . import testutil
+
+NOTE = {'type': 'Note', 'content': 'hello'}
+
+
+class DeliverTest(testutil.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = Activity(id='http://orig/post https://inbox',
+                                 domain=['orig'], direction='out',
+                                 protocol='activitypub')
+        self.activity.put()
+        self.params = {
+            'activity_id': 'http://orig/post https://inbox',
+            'inbox': 'https://inbox',
+            'user_domain': 'orig',
+            'host_url': 'http://fed.brid.gy/',
+            'activity': json_dumps(NOTE),
+        }
+        self.headers = {'X-AppEngine-QueueName': 'deliver'}
+
+    @mock.patch.object(activitypub, 'send')
+    def test_deliver(self, mock_send):
+        got = self.client.post('/_ah/queue/deliver', data=self.params,
+                               headers=self.headers)
+        self.assertEqual(200, got.status_code)
+        # signs with the host the delivery was enqueued on, not this request's
+        mock_send.assert_called_once_with(NOTE, 'https://inbox', 'orig',
+                                          host_url='http://fed.brid.gy/')
+        self.assertEqual('complete', self.activity.key.get().status)
+
+    @mock.patch.object(appengine_info, 'LOCAL', False)
+    @mock.patch.object(activitypub, 'send')
+    def test_deliver_not_from_cloud_tasks(self, mock_send):
+        got = self.client.post('/_ah/queue/deliver', data=self.params)
+        self.assertEqual(403, got.status_code)
+        mock_send.assert_not_called()
+        self.assertEqual('new', self.activity.key.get().status)
+
+    @mock.patch.object(appengine_info, 'LOCAL', False)
+    @mock.patch.object(activitypub, 'send')
+    def test_deliver_queue_header(self, mock_send):
+        got = self.client.post('/_ah/queue/deliver', data=self.params,
+                               headers=self.headers)
+        self.assertEqual(200, got.status_code)
+        mock_send.assert_called_once()
+
+    @mock.patch.object(activitypub, 'send')
+    def test_deliver_no_activity(self, mock_send):
+        self.activity.key.delete()
+        got = self.client.post('/_ah/queue/deliver', data=self.params,
+                               headers=self.headers)
+        self.assertEqual(200, got.status_code)
+        mock_send.assert_not_called()
+
+    @mock.patch.object(activitypub, 'send', side_effect=BadGateway())
+    def test_deliver_error(self, mock_send):
+        # the handler re-raises so Cloud Tasks retries, but records the error
+        got = self.client.post('/_ah/queue/deliver', data=self.params,
+                               headers=self.headers)
+        self.assertEqual(502, got.status_code)
+        self.assertEqual('error', self.activity.key.get().status)
@@ -17,6 +17,7 @@ from oauth_dropins.webutil.util import json_dumps, json_loads
 import requests
 
 import activitypub
+import common
 from common import (
     CONNEG_HEADERS_AS2,
     CONNEG_HEADERS_AS2_HTML,
@@ -734,6 +735,61 @@ class WebmentionTest(testutil.TestCase):
                                   else self.create_mf2),
                                  json_loads(activity.source_mf2), inbox)
 
+    def test_activitypub_create_post_pre_index_followers(self, mock_get, mock_post):
+        """Followers from before FolloweeIndex existed still get deliveries."""
+        mock_get.side_effect = [self.create, self.actor]
+        mock_post.return_value = requests_response('abc xyz')
+
+        # raw put, ie a follow from before the index existed
+        Follower(id=Follower._id('orig', 'https://mastodon/aaa'),
+                 src='https://mastodon/aaa', dest='orig',
+                 last_follow=json_dumps({'actor': {
+                     'inbox': 'https://old/inbox',
+                 }})).put()
+        # first follow after deploy creates and seeds the index
+        Follower.get_or_create('orig', 'https://mastodon/bbb',
+                               last_follow=json_dumps({'actor': {
+                                   'inbox': 'https://new/inbox',
+                               }}))
+
+        got = self.client.post('/webmention', data={
+            'source': 'http://orig/post',
+            'target': 'https://fed.brid.gy/',
+        })
+        self.assertEqual(200, got.status_code)
+        self.assertEqual(['https://new/inbox', 'https://old/inbox'],
+                         [call[0][0] for call in mock_post.call_args_list])
+
+    @mock.patch.object(webmention.appengine_info, 'LOCAL', False)
+    @mock.patch.object(common, '_session', None)
+    @mock.patch.object(common, 'create_task')
+    def test_activitypub_create_post_enqueues_deliveries(
+            self, mock_create_task, mock_get, mock_post):
+        mock_get.side_effect = [self.create, self.actor]
+
+        Follower.get_or_create('orig', 'https://mastodon/aaa',
+                               last_follow=json_dumps({'actor': {
+                                   'inbox': 'https://inbox',
+                               }}))
+
+        got = self.client.post('/webmention', data={
+            'source': 'http://orig/post',
+            'target': 'https://fed.brid.gy/',
+        })
+        self.assertEqual(202, got.status_code)
+        mock_post.assert_not_called()
+
+        mock_create_task.assert_called_once_with(
+            'deliver', activity_id='http://orig/post https://inbox',
+            inbox='https://inbox', user_domain='orig',
+            host_url='http://localhost/', activity=mock.ANY)
+        self.assert_equals(self.create_as2, json_loads(
+            mock_create_task.call_args[1]['activity']))
+
+        # delivery isn't attempted until the task runs
+        activity = Activity.get_by_id('http://orig/post https://inbox')
+        self.assertEqual('new', activity.status)
+
     def test_activitypub_create_with_image(self, mock_get, mock_post):
         create_html = self.create_html.replace(
             '</body>', '<img class="u-photo" src="http://im/age" />\n</body>')
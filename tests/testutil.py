@@ -9,6 +9,7 @@ from oauth_dropins.webutil import testutil, util
 from oauth_dropins.webutil.appengine_config import ndb_client
 import requests
 
+import activitypub
 import common
 
 
@@ -19,6 +20,10 @@ class TestCase(unittest.TestCase, testutil.Asserts):
         super().setUp()
         app.testing = True
         cache.clear()
+        # each test generates fresh user keys, so don't reuse cached users or
+        # signers
+        activitypub.get_user.cache_clear()
+        activitypub.signature_auth.cache_clear()
         self.client = app.test_client()
 
         # clear datastore
@@ -4,6 +4,7 @@ https://webfinger.net/
 https://tools.ietf.org/html/rfc7033
 """
 import datetime
+import functools
 import logging
 import re
 import urllib.parse
@@ -14,6 +15,7 @@ import mf2util
 from oauth_dropins.webutil import flask_util, util
 from oauth_dropins.webutil.flask_util import error
 from oauth_dropins.webutil.util import json_dumps
+from werkzeug.http import parse_list_header
 
 from app import app, cache
 import common
@@ -25,10 +27,45 @@ NON_TLDS = frozenset(('html', 'json', 'php', 'xml'))
 logger = logging.getLogger(__name__)
 
 
-# TODO
-# @cache.cached(
-#     CACHE_TIME.total_seconds(),
-#     make_cache_key=lambda domain: f'{request.path} {request.headers.get("Accept")}')
+@functools.lru_cache(maxsize=512)
+def actor_links(host_url, domain):
+    """Returns the ActivityPub WebFinger links for the given domain.
+
+    These depend only on (host_url, domain), so build them once per user
+    instead of on every request. Returns a tuple; don't mutate the dicts.
+
+    Args:
+      host_url: string
+      domain: string
+
+    Returns:
+      tuple of dicts
+    """
+    return ({
+        'rel': 'self',
+        'type': common.CONTENT_TYPE_AS2,
+        # WARNING: in python 2 sometimes request.host_url lost port,
+        # http://localhost:8080 would become just http://localhost. no
+        # clue how or why. pay attention here if that happens again.
+        'href': f'{host_url}{domain}',
+    }, {
+        'rel': 'inbox',
+        'type': common.CONTENT_TYPE_AS2,
+        'href': f'{host_url}{domain}/inbox',
+    }, {
+        # AP reads this from the AS2 actor, not webfinger, so strictly
+        # speaking, it's probably not needed here.
+        # https://www.w3.org/TR/activitypub/#sharedInbox
+        'rel': 'sharedInbox',
+        'type': common.CONTENT_TYPE_AS2,
+        'href': f'{host_url}inbox',
+    })
+
+
+def webfinger_cache_key(*args, **kwargs):
+    """Varies on Accept (and ?format=) since XrdOrJrd serves JRD and XRD."""
+    return f'webfinger {request.full_path} {request.headers.get("Accept")}'
+
 
 class Actor(flask_util.XrdOrJrd):
     """Fetches a site's home page, converts its mf2 to WebFinger, and serves."""
@@ -48,8 +85,10 @@ class Actor(flask_util.XrdOrJrd):
 
         for candidate in urls:
             resp = common.requests_get(candidate)
-            parsed = util.parse_html(resp)
-            mf2 = util.parse_mf2(parsed, url=resp.url)
+            # mf2py collects rel/rel-urls alongside the items in its one pass
+            # over the DOM, so the Atom feed discovery below can read those
+            # instead of a separate BeautifulSoup .find() walk of the tree
+            mf2 = util.parse_mf2(resp)
             # logger.debug(f'Parsed mf2 for {resp.url}: {json_dumps(mf2, indent=2)}')
             hcard = mf2util.representative_hcard(mf2, resp.url)
             if hcard:
@@ -67,11 +106,14 @@ class Actor(flask_util.XrdOrJrd):
         username = common.get_username(domain, urls)
         acct = f'{username}@{domain}'
 
-        # discover atom feed, if any
-        atom = parsed.find('link', rel='alternate', type=common.CONTENT_TYPE_ATOM)
-        if atom and atom['href']:
-            atom = urllib.parse.urljoin(resp.url, atom['href'])
-        else:
+        # discover atom feed, if any. rel-urls keys are already resolved
+        # against the page URL, so no urljoin needed.
+        atom = next(
+            (feed_url for feed_url, info in mf2.get('rel-urls', {}).items()
+             if 'alternate' in info.get('rels', ())
+                and info.get('type') == common.CONTENT_TYPE_ATOM),
+            None)
+        if not atom:
             atom = 'https://granary.io/url?' + urllib.parse.urlencode({
                 'input': 'html',
                 'output': 'atom',
@@ -79,15 +121,20 @@ class Actor(flask_util.XrdOrJrd):
                 'hub': resp.url,
             })
 
-        # discover PuSH, if any
-        for link in resp.headers.get('Link', '').split(','):
-            match = common.LINK_HEADER_RE.match(link)
-            if match and match.group(2) == 'hub':
-                hub = match.group(1)
-            else:
-                hub = 'https://bridgy-fed.superfeedr.com/'
-
-        # generate webfinger content
+        # discover PuSH, if any. parse_list_header handles quoted commas,
+        # which the old split(',') corrupted, and the first rel=hub link wins
+        # instead of getting clobbered by the fallback on later iterations.
+        hub = next(
+            (match.group(1)
+             for link in parse_list_header(resp.headers.get('Link', ''))
+             if (match := common.LINK_HEADER_RE.match(link))
+                and match.group(2) == 'hub'),
+            'https://bridgy-fed.superfeedr.com/')
+
+        # generate webfinger content. only the h-card-derived parts can
+        # contain nulls, so only they go through the trim_nulls walk; the
+        # ActivityPub links are precomputed per user by actor_links, and the
+        # OStatus links always have hrefs (atom and hub have fallbacks above).
         data = util.trim_nulls({
             'subject': 'acct:' + acct,
             'aliases': urls,
@@ -103,29 +150,9 @@ class Actor(flask_util.XrdOrJrd):
                 'rel': 'canonical_uri',
                 'type': 'text/html',
                 'href': canonical_url,
-            },
-
-            # ActivityPub
-            {
-                'rel': 'self',
-                'type': common.CONTENT_TYPE_AS2,
-                # WARNING: in python 2 sometimes request.host_url lost port,
-                # http://localhost:8080 would become just http://localhost. no
-                # clue how or why. pay attention here if that happens again.
-                'href': f'{request.host_url}{domain}',
-            }, {
-                'rel': 'inbox',
-                'type': common.CONTENT_TYPE_AS2,
-                'href': f'{request.host_url}{domain}/inbox',
-            }, {
-                # AP reads this from the AS2 actor, not webfinger, so strictly
-                # speaking, it's probably not needed here.
-                # https://www.w3.org/TR/activitypub/#sharedInbox
-                'rel': 'sharedInbox',
-                'type': common.CONTENT_TYPE_AS2,
-                'href': f'{request.host_url}inbox',
-            },
-
+            }],
+        })
+        data['links'] += list(actor_links(request.host_url, domain)) + [
             # OStatus
             {
                 'rel': 'http://schemas.google.com/g/2010#updates-from',
@@ -141,7 +168,6 @@ class Actor(flask_util.XrdOrJrd):
                 'rel': 'salmon',
                 'href': f'{request.host_url}{domain}/salmon',
             }]
-        })
         logger.info(f'Returning WebFinger data: {json_dumps(data, indent=2)}')
         return data
 
@@ -196,8 +222,11 @@ def host_meta_xrds():
             {'Content-Type': 'application/xrds+xml'})
 
 
+cached = cache.cached(CACHE_TIME.total_seconds(),
+                      make_cache_key=webfinger_cache_key)
 app.add_url_rule(f'/acct:<regex("{common.DOMAIN_RE}"):domain>',
-                 view_func=Actor.as_view('actor_acct'))
-app.add_url_rule('/.well-known/webfinger', view_func=Webfinger.as_view('webfinger'))
+                 view_func=cached(Actor.as_view('actor_acct')))
+app.add_url_rule('/.well-known/webfinger',
+                 view_func=cached(Webfinger.as_view('webfinger')))
 app.add_url_rule('/.well-known/host-meta', view_func=HostMeta.as_view('hostmeta'))
 app.add_url_rule('/.well-known/host-meta.json', view_func=HostMeta.as_view('hostmeta-json'))
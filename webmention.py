@@ -16,16 +16,16 @@ from flask.views import View
 from google.cloud.ndb import Key
 from granary import as1, as2, atom, microformats2
 import mf2util
-from oauth_dropins.webutil import flask_util, util
+from oauth_dropins.webutil import appengine_info, flask_util, util
 from oauth_dropins.webutil.flask_util import error
 from oauth_dropins.webutil.util import json_dumps, json_loads
 import requests
 from werkzeug.exceptions import BadGateway
 
 import activitypub
-from app import app
+from app import app, cache
 import common
-from models import Follower, User, Activity
+from models import Follower, FolloweeIndex, User, Activity
 
 logger = logging.getLogger(__name__)
 
@@ -98,6 +98,7 @@ class Webmention(View):
         user = User.get_or_create(self.source_domain)
         error = None
         last_success = None
+        enqueued = 0
 
         # TODO: collect by inbox, add 'to' fields, de-dupe inboxes and recipients
 
@@ -106,6 +107,9 @@ class Webmention(View):
             if dest_url:
                 Follower.get_or_create(dest=dest_url, src=self.source_domain,
                                        last_follow=json_dumps(self.source_obj))
+                # evict the memoized fan-out list so this follow takes effect
+                # immediately instead of after the cache TTL
+                cache.delete_memoized(activitypub.follower_domains, dest_url)
 
         for resp, inbox in targets:
             target_obj = json_loads(resp.target_as2) if resp.target_as2 else None
@@ -130,6 +134,19 @@ class Webmention(View):
                 if source_activity.get('type') == 'Create':
                     source_activity['type'] = 'Update'
 
+            if not appengine_info.LOCAL:
+                # deliver asynchronously on the deliver queue so that big
+                # follower fan-outs don't block this request (or its App
+                # Engine instance). local dev has no Cloud Tasks service, so
+                # it delivers inline below instead.
+                common.create_task('deliver', activity_id=resp.key.id(),
+                                   inbox=inbox, user_domain=self.source_domain,
+                                   host_url=request.host_url,
+                                   activity=json_dumps(source_activity))
+                resp.put()
+                enqueued += 1
+                continue
+
             try:
                 last = activitypub.send(source_activity, inbox, self.source_domain)
                 resp.status = 'complete'
@@ -140,6 +157,9 @@ class Webmention(View):
 
             resp.put()
 
+        if enqueued:
+            return f'Enqueued {enqueued} deliveries', 202
+
         # Pass the AP response status code and body through as our response
         if last_success:
             return last_success.text or 'Sent!', last_success.status_code
@@ -174,17 +194,21 @@ class Webmention(View):
         targets = self._targets()
 
         if not targets:
-            # interpret this as a Create or Update, deliver it to followers
-            inboxes = set()
-            for follower in Follower.query().filter(
-                Follower.key > Key('Follower', self.source_domain + ' '),
-                Follower.key < Key('Follower', self.source_domain + chr(ord(' ') + 1))):
-                if follower.status != 'inactive' and follower.last_follow:
-                    actor = json_loads(follower.last_follow).get('actor')
-                    if actor and isinstance(actor, dict):
-                        inboxes.add(actor.get('endpoints', {}).get('sharedInbox') or
-                                    actor.get('publicInbox')or
-                                    actor.get('inbox'))
+            # interpret this as a Create or Update, deliver it to followers.
+            # the FolloweeIndex entity has all followers' inboxes in one flat
+            # list, so one get replaces hydrating each Follower and JSON-parsing
+            # its last_follow just to pull out an inbox URL.
+            index = FolloweeIndex.get_by_id(self.source_domain)
+            if index is not None:
+                inboxes = set(index.inboxes)
+            else:
+                # no index entity yet; fall back to scanning Follower
+                inboxes = set()
+                for follower in Follower.query().filter(
+                    Follower.key > Key('Follower', self.source_domain + ' '),
+                    Follower.key < Key('Follower', self.source_domain + chr(ord(' ') + 1))):
+                    if follower.status != 'inactive':
+                        inboxes.add(follower.inbox())
             inboxes = [(Activity.get_or_create(
                           source=self.source_url, target=inbox,
                           domain=[self.source_domain], direction='out',